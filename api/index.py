@@ -1,72 +1,110 @@
-from fastapi import FastAPI, HTTPException, Response
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from fastapi import Body, FastAPI, HTTPException, Response
+from typing import List, Dict, Any, Tuple
+from typing_extensions import TypedDict
+from contextlib import asynccontextmanager
+from functools import lru_cache
 import os
 import json
-import math
 import csv
+import sys
 
-app = FastAPI()
+import numpy as np
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - stdlib fallback
+    _loads = json.loads
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # Parse + aggregate the data file before serving, so the first POST
+    # already hits the cache. A missing/bad/unreadable file must not take
+    # down / and OPTIONS; it resurfaces as a 500 from the request path.
+    try:
+        _load_aggregates_cached()
+    except (HTTPException, OSError, ValueError, csv.Error):
+        pass
+    yield
+
+
+app = FastAPI(lifespan=_lifespan)
 
 
 # -----------------------------
 # CORS (manual, no middleware)
 # -----------------------------
-def cors_headers() -> Dict[str, str]:
-    return {
-        "Access-Control-Allow-Origin": "*",
-        "Access-Control-Allow-Methods": "POST, GET, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type, Authorization",
-        "Access-Control-Expose-Headers": "Access-Control-Allow-Origin",
-    }
+_CORS_HEADERS: Dict[str, str] = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "POST, GET, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, Authorization",
+    "Access-Control-Expose-Headers": "Access-Control-Allow-Origin",
+}
 
 
 # -----------------------------
-# Request model
+# Response shape
 # -----------------------------
-class TelemetryRequest(BaseModel):
-    regions: List[str]
-    threshold_ms: float
+# Declared as return annotations so FastAPI serializes straight to JSON
+# bytes via pydantic instead of going through a custom response class.
+class RegionStats(TypedDict):
+    avg_latency: float
+    p95_latency: float
+    avg_uptime: float
+    breaches: int
+
+
+class TelemetryResponse(TypedDict):
+    regions: Dict[str, RegionStats]
 
 
 # -----------------------------
-# Stats helpers
+# Request parsing
 # -----------------------------
-def mean(vals: List[float]) -> float:
-    return sum(vals) / len(vals) if vals else 0.0
+def parse_telemetry_request(body: Dict[str, Any]) -> Tuple[List[str], float]:
+    """
+    Minimal manual validation of {"regions": [...], "threshold_ms": number}
+    (cheaper than building a pydantic model per request).
+    """
+    regions = body.get("regions")
+    if not isinstance(regions, list) or not all(isinstance(x, str) for x in regions):
+        raise HTTPException(status_code=422, detail="regions must be a list of strings")
 
+    try:
+        threshold_ms = float(body["threshold_ms"])
+    except (KeyError, TypeError, ValueError, OverflowError):
+        raise HTTPException(status_code=422, detail="threshold_ms must be a number")
 
-def p95(vals: List[float]) -> float:
+    return regions, threshold_ms
+
+
+# -----------------------------
+# Stats helpers
+# -----------------------------
+def p95_sorted(lat_sorted: np.ndarray) -> float:
     """
     Interpolated 95th percentile (like numpy percentile default style).
     This is likely what the grader expects (e.g., 216.44).
+
+    Takes an already sorted array, so it is an O(1) index + interpolation.
     """
-    if not vals:
+    n = lat_sorted.size
+    if n == 0:
         return 0.0
 
-    s = sorted(float(x) for x in vals)
-    n = len(s)
+    pos = (n - 1) * 0.95
+    lo = int(pos)
+    hi = min(lo + 1, n - 1)
 
-    if n == 1:
-        return s[0]
-
-    p = 0.95
-    pos = (n - 1) * p
-    lo = int(math.floor(pos))
-    hi = int(math.ceil(pos))
-    frac = pos - lo
-
-    if hi >= n:
-        hi = n - 1
-
-    return s[lo] + (s[hi] - s[lo]) * frac
+    return float(lat_sorted[lo] + (lat_sorted[hi] - lat_sorted[lo]) * (pos - lo))
 
 
 # -----------------------------
 # Data loader
 # -----------------------------
-def load_records() -> List[Dict[str, Any]]:
+def find_data_path() -> str:
     """
     Supports:
       - data/q-vercel-latency.json
@@ -93,10 +131,33 @@ def load_records() -> List[Dict[str, Any]]:
     if path is None:
         raise HTTPException(status_code=500, detail="Telemetry file not found in /data")
 
+    return path
+
+
+def _read_bytes(path: str, size: int) -> bytes:
+    # os.read sized from the cache-key stat (normally a single syscall);
+    # keep reading on short reads (~2 GiB cap, file changed since stat)
+    # and drain to EOF so a grown file is never cached truncated.
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        chunks = []
+        remaining = max(size, 1)
+        while True:
+            chunk = os.read(fd, remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining = max(remaining - len(chunk), 1 << 16)
+        return b"".join(chunks)
+    finally:
+        os.close(fd)
+
+
+def load_records(path: str, size: int) -> List[Dict[str, Any]]:
     # ---- JSON ----
     if path.endswith(".json"):
-        with open(path, "r", encoding="utf-8") as f:
-            payload = json.load(f)
+        # orjson wants bytes; json.loads accepts them too
+        payload = _loads(_read_bytes(path, size))
 
         # supports either:
         #   [ {...}, {...} ]
@@ -131,7 +192,7 @@ def load_records() -> List[Dict[str, Any]]:
             try:
                 records.append(
                     {
-                        "region": str(region).strip().lower(),
+                        "region": sys.intern(str(region).strip().lower()),
                         "latency_ms": float(latency),
                         "uptime": float(uptime),
                     }
@@ -166,7 +227,7 @@ def load_records() -> List[Dict[str, Any]]:
             try:
                 records.append(
                     {
-                        "region": str(region).strip().lower(),
+                        "region": sys.intern(str(region).strip().lower()),
                         "latency_ms": float(latency),
                         "uptime": float(uptime),
                     }
@@ -177,53 +238,120 @@ def load_records() -> List[Dict[str, Any]]:
     return records
 
 
+RegionAgg = Tuple[float, float, int, np.ndarray]
+
+
+def build_region_aggregates(records: List[Dict[str, Any]]) -> Dict[str, RegionAgg]:
+    """
+    Pre-aggregate row records per region:
+      {region: (sum_latency, sum_uptime, count, sorted latency_ms[])}
+
+    Averages, p95 and breach counts can then all be answered without
+    touching individual rows.
+
+    Regions are encoded to int codes in one pass; a single lexsort by
+    (code, latency) then lays every region out as one contiguous, already
+    sorted run, which is split off by the per-code counts.
+    """
+    lat_all = np.asarray([r["latency_ms"] for r in records], dtype=np.float64)
+    up_all = np.asarray([r["uptime"] for r in records], dtype=np.float64)
+
+    region_vocab: Dict[str, int] = {}
+    codes = [region_vocab.setdefault(r["region"], len(region_vocab)) for r in records]
+    codes_arr = np.asarray(codes, dtype=np.intp)
+
+    order = np.lexsort((lat_all, codes_arr))
+    counts = np.bincount(codes_arr, minlength=len(region_vocab))
+    bounds = np.cumsum(counts)[:-1]
+    lat_runs = np.split(lat_all[order], bounds)
+    up_runs = np.split(up_all[order], bounds)
+
+    agg: Dict[str, RegionAgg] = {}
+    for region, code in region_vocab.items():
+        lat_sorted = lat_runs[code]
+        agg[region] = (
+            float(lat_sorted.sum()),
+            float(up_runs[code].sum()),
+            int(lat_sorted.size),
+            lat_sorted,
+        )
+
+    return agg
+
+
+# -----------------------------
+# Aggregates cache
+# -----------------------------
+@lru_cache(maxsize=1)
+def _load_for_key(path: str, mtime_ns: int, size: int) -> Dict[str, RegionAgg]:
+    # mtime_ns/size are only part of the cache key: a rewritten file
+    # produces a new key, which evicts the stale entry (maxsize=1).
+    # Only the aggregates are kept; the per-row records are dropped.
+    return build_region_aggregates(load_records(path, size))
+
+
+def _load_aggregates_cached() -> Dict[str, RegionAgg]:
+    path = find_data_path()
+    st = os.stat(path)
+    return _load_for_key(path, st.st_mtime_ns, st.st_size)
+
+
 # -----------------------------
 # Routes
 # -----------------------------
+_RESULT_KEYS = ("avg_latency", "p95_latency", "avg_uptime", "breaches")
+_ZERO_RESULT: Dict[str, Any] = dict(zip(_RESULT_KEYS, (0.0, 0.0, 0.0, 0)))
+
+
 @app.get("/")
-def root():
-    return JSONResponse({"ok": True}, headers=cors_headers())
+def root(response: Response) -> Dict[str, bool]:
+    response.headers.update(_CORS_HEADERS)
+    return {"ok": True}
 
 
 # Explicit preflight handler
 @app.options("/api/telemetry")
 def telemetry_options():
-    return Response(status_code=200, headers=cors_headers())
+    return Response(status_code=200, headers=_CORS_HEADERS)
 
 
 @app.post("/api/telemetry")
-def telemetry(req: TelemetryRequest):
-    records = load_records()
-
-    requested = [str(x).strip().lower() for x in req.regions if str(x).strip()]
-    if not requested:
+def telemetry(response: Response, body: Dict[str, Any] = Body(...)) -> TelemetryResponse:
+    regions, threshold_ms = parse_telemetry_request(body)
+    agg = _load_aggregates_cached()
+
+    # normalize once; dict.fromkeys dedupes while keeping request order,
+    # and the same dict is filled in as the result (values only change,
+    # so iterating its keys while assigning is safe)
+    out: Dict[str, Any] = dict.fromkeys(
+        name for name in (x.strip().lower() for x in regions) if name
+    )
+    if not out:
         raise HTTPException(status_code=400, detail="regions cannot be empty")
 
-    requested_set = set(requested)
-    out: Dict[str, Any] = {}
-
-    for region in requested_set:
-        rows = [r for r in records if r["region"] == region]
+    for region in out:
+        region_agg = agg.get(region)
 
-        if not rows:
-            out[region] = {
-                "avg_latency": 0.0,
-                "p95_latency": 0.0,
-                "avg_uptime": 0.0,
-                "breaches": 0,
-            }
+        if region_agg is None:
+            out[region] = _ZERO_RESULT.copy()
             continue
 
-        latencies = [r["latency_ms"] for r in rows]
-        uptimes = [r["uptime"] for r in rows]
-        breaches = sum(1 for r in rows if r["latency_ms"] > req.threshold_ms)
-
-        out[region] = {
-            "avg_latency": round(mean(latencies), 2),
-            "p95_latency": round(p95(latencies), 2),
-            "avg_uptime": round(mean(uptimes), 6),
-            "breaches": breaches,
-        }
+        s_lat, s_up, n, lat_sorted = region_agg
+        # everything right of the threshold's insertion point is a breach
+        breaches = int(n - np.searchsorted(lat_sorted, threshold_ms, side="right"))
+
+        out[region] = dict(
+            zip(
+                _RESULT_KEYS,
+                (
+                    round(s_lat / n, 2),
+                    round(p95_sorted(lat_sorted), 2),
+                    round(s_up / n, 6),
+                    breaches,
+                ),
+            )
+        )
 
+    response.headers.update(_CORS_HEADERS)
     # Grader expects top-level "regions"
-    return JSONResponse({"regions": out}, headers=cors_headers())
+    return {"regions": out}